@@ -0,0 +1,108 @@
+# admission.py
+import time
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cheaper analysis plans tried in order when an upload is over budget; each one reduces the frames actually processed.
+BATCH_PLANS = ({"sample_rate": 5, "max_frames": 20}, {"sample_rate": 5, "max_frames": 10}, {"sample_rate": 5, "max_frames": 5})
+STREAM_PLANS = ({"sample_rate": 5}, {"sample_rate": 10}, {"sample_rate": 20}, {"sample_rate": 40})
+
+class AdmissionController:
+    def __init__(self, capacity: int = 2, max_pixels: int = 3840 * 2160, max_estimated_seconds: float = 600.0,
+                 max_stream_seconds: float = 3600.0, queue_timeout: float = 30.0, seconds_per_unit: float = 0.005):
+        self.capacity = max(1, capacity)
+        self.max_pixels = max_pixels
+        self.max_estimated_seconds = max_estimated_seconds
+        self.max_stream_seconds = max_stream_seconds
+        self.queue_timeout = queue_timeout
+        self.seconds_per_unit = seconds_per_unit
+        self._running: Dict[str, int] = {}
+        self._waiting: Dict[str, int] = {}
+        self._cond = threading.Condition()
+
+    def assess(self, probe: Dict[str, Any]) -> Dict[str, Any]:
+        if not probe.get("readable"):
+            return {"admitted": False, "rejection": "corrupt", "reason": "Video could not be opened; the file may be corrupt."}
+        width, height = probe.get("width", 0), probe.get("height", 0)
+        if width <= 0 or height <= 0:
+            return {"admitted": False, "rejection": "corrupt", "reason": "Video reports no resolution; the file may be corrupt."}
+        if width * height > self.max_pixels:
+            return {"admitted": False, "rejection": "over_resolution",
+                    "reason": f"Resolution {width}x{height} exceeds the supported maximum."}
+        return {"admitted": True, "rejection": None, "reason": None}
+
+    def plans(self, stream: bool) -> Tuple[Dict[str, Any], ...]:
+        return STREAM_PLANS if stream else BATCH_PLANS
+
+    def check_budget(self, cost: Dict[str, Any], stream: bool = False) -> Dict[str, Any]:
+        budget_seconds = self.max_stream_seconds if stream else self.max_estimated_seconds
+        with self._cond:
+            queued = sum(self._waiting.values())
+            busy = sum(self._running.values()) >= self.capacity
+        if cost["cost_units"] is None:
+            # Unknown length (no frame count in the container): admit and let the analysis itself take its time.
+            return {"within_budget": True, "budget_seconds": budget_seconds, "estimated_seconds": None,
+                    "eta_seconds": None, "queued": queued}
+        estimated_seconds = cost["cost_units"] * self.seconds_per_unit
+        queue_wait = (queued + (1 if busy else 0)) / self.capacity * estimated_seconds
+        return {
+            "within_budget": estimated_seconds <= budget_seconds,
+            "budget_seconds": budget_seconds,
+            "estimated_seconds": round(estimated_seconds, 2),
+            "eta_seconds": round(estimated_seconds + queue_wait, 2),
+            "queued": queued
+        }
+
+    def _fair_share(self) -> int:
+        active_users = {u for u, n in self._running.items() if n > 0} | set(self._waiting)
+        return max(1, self.capacity // max(1, len(active_users)))
+
+    def _can_run(self, user_id: str) -> bool:
+        if sum(self._running.values()) >= self.capacity:
+            return False
+        # Under contention each active user is held to an equal slice of the workers.
+        return self._running.get(user_id, 0) < self._fair_share()
+
+    def acquire(self, user_id: str, timeout: Optional[float] = None) -> bool:
+        timeout = self.queue_timeout if timeout is None else timeout
+        deadline = time.time() + timeout
+        with self._cond:
+            self._waiting[user_id] = self._waiting.get(user_id, 0) + 1
+            try:
+                while not self._can_run(user_id):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        logger.warning(f"Admission timed out for user '{user_id}'.")
+                        return False
+                    self._cond.wait(remaining)
+                self._running[user_id] = self._running.get(user_id, 0) + 1
+                return True
+            finally:
+                self._waiting[user_id] -= 1
+                if not self._waiting[user_id]:
+                    del self._waiting[user_id]
+
+    def release(self, user_id: str):
+        with self._cond:
+            self._running[user_id] = self._running.get(user_id, 1) - 1
+            if self._running[user_id] <= 0:
+                del self._running[user_id]
+            self._cond.notify_all()
+
+    def observe(self, cost_units: float, elapsed_seconds: float, alpha: float = 0.2):
+        if cost_units <= 0 or elapsed_seconds <= 0:
+            return
+        with self._cond:
+            self.seconds_per_unit = (1 - alpha) * self.seconds_per_unit + alpha * (elapsed_seconds / cost_units)
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "running": dict(self._running),
+                "waiting": dict(self._waiting),
+                "seconds_per_unit": round(self.seconds_per_unit, 6)
+            }
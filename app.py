@@ -1,5 +1,6 @@
 # app.py
 import os
+import atexit
 import logging
 from functools import wraps
 import uuid
@@ -8,12 +9,18 @@ from datetime import datetime
 
 from flask import (
     Flask, request, jsonify, render_template, redirect, url_for, session,
-    send_from_directory, Response
+    send_from_directory, Response, stream_with_context
 )
 
 from models import UserManager, ResultStorage
-from processing import DeepfakeDetectionEngine
+from processing import DeepfakeDetectionEngine, FrameHashCache, FaceROILocator
 from report_utils import generate_pdf_report
+from frame_ring import SharedMemoryFrameDecoder
+from frame_archive import FrameArchive
+from chunked_upload import ChunkedUploadManager, CHUNKED_UPLOAD_MAX_SIZE
+from admission import AdmissionController
+from rescore_jobs import RescoreJobManager
+from export_utils import EXPORT_FORMATS, parse_export_filters, iter_export
 
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov'}
@@ -21,6 +28,17 @@ MAX_CONTENT_LENGTH = 100 * 1024 * 1024
 SECRET_KEY = os.urandom(24)
 SESSION_COOKIE_SECURE = False
 SESSION_COOKIE_SAMESITE = 'Lax'
+FRAME_CACHE_ENABLED = False
+FRAME_CACHE_SIZE = 10000
+FRAME_CACHE_MAX_DISTANCE = 0
+FACE_ROI_ENABLED = False
+SHARED_MEMORY_DECODE = False
+STATS_BACKEND = 'numpy'
+FRAME_ARCHIVE_ENABLED = False
+FRAME_ARCHIVE_RETENTION_SECONDS = 7 * 24 * 3600
+ANALYSIS_WORKER_CAPACITY = 2
+MAX_ESTIMATED_ANALYSIS_SECONDS = 600
+MAX_ESTIMATED_STREAM_SECONDS = 3600
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s:%(module)s:%(funcName)s:%(lineno)d: %(message)s')
 logger = logging.getLogger(__name__)
@@ -39,7 +57,27 @@ if not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], 'frames')):
 
 user_manager = UserManager()
 result_storage = ResultStorage()
-detection_engine = DeepfakeDetectionEngine(upload_folder_base=app.config['UPLOAD_FOLDER'])
+frame_decoder = SharedMemoryFrameDecoder(workers=ANALYSIS_WORKER_CAPACITY) if SHARED_MEMORY_DECODE else None
+if frame_decoder is not None:
+    atexit.register(frame_decoder.shutdown)
+detection_engine = DeepfakeDetectionEngine(
+    upload_folder_base=app.config['UPLOAD_FOLDER'],
+    frame_cache=FrameHashCache(capacity=FRAME_CACHE_SIZE, max_distance=FRAME_CACHE_MAX_DISTANCE) if FRAME_CACHE_ENABLED else None,
+    roi_locator=FaceROILocator() if FACE_ROI_ENABLED else None,
+    frame_decoder=frame_decoder,
+    stats_backend=STATS_BACKEND,
+    frame_archive=FrameArchive(os.path.join(UPLOAD_FOLDER, 'archive'), retention_seconds=FRAME_ARCHIVE_RETENTION_SECONDS) if FRAME_ARCHIVE_ENABLED else None
+)
+rescore_jobs = RescoreJobManager(detection_engine, result_storage)
+upload_manager = ChunkedUploadManager(app.config['UPLOAD_FOLDER'], max_size=CHUNKED_UPLOAD_MAX_SIZE)
+admission_controller = AdmissionController(capacity=ANALYSIS_WORKER_CAPACITY, max_estimated_seconds=MAX_ESTIMATED_ANALYSIS_SECONDS,
+                                           max_stream_seconds=MAX_ESTIMATED_STREAM_SECONDS)
+
+def prune_orphaned_archives():
+    # Results live in memory, so archives left over from a previous run can no longer be re-scored.
+    # Called once at server start, never at import: spawned decoder workers re-import this module.
+    if detection_engine.frame_archive is not None:
+        detection_engine.frame_archive.prune(res.get('frame_archive') for res in result_storage.get_all_results())
 
 @app.template_filter('format_datetime')
 def format_datetime_filter(s):
@@ -161,15 +199,7 @@ def analyze_video_route():
         temp_video_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
         file.save(temp_video_path)
         logger.info(f"Video '{filename}' (saved as {unique_filename}) for analysis by {session.get('username')}.")
-
-        analysis_result = detection_engine.analyze_video(temp_video_path, filename)
-
-        if analysis_result.get("success"):
-            result_id = result_storage.save_result(session['user_id'], analysis_result)
-            analysis_result['result_id'] = result_id
-            return jsonify(analysis_result)
-        else:
-            return jsonify(analysis_result), 500
+        return run_analysis(temp_video_path, filename, request.form)
 
     except Exception as e:
         logger.exception(f"Critical error during video analysis for user {session.get('username')}:")
@@ -181,6 +211,142 @@ def analyze_video_route():
                  logger.error(f"Error deleting temp file {temp_video_path} during exception handling: {del_e}")
         return jsonify({"success": False, "message": f"An internal server error occurred."}), 500
 
+def discard_video(video_path):
+    try:
+        os.remove(video_path)
+        logger.info(f"Discarded rejected upload {video_path}.")
+    except OSError as e:
+        logger.error(f"Error deleting rejected upload {video_path}: {e}")
+
+def preflight_video(video_path, stream):
+    probe = detection_engine.video_processor.probe_video(video_path)
+    decision = admission_controller.assess(probe)
+    preflight = {"probe": probe, **decision}
+    if not decision["admitted"]:
+        return preflight
+    plans = admission_controller.plans(stream)
+    for degraded, plan in enumerate(plans):
+        cost = detection_engine.estimate_cost(probe, stream=stream, **plan)
+        budget = admission_controller.check_budget(cost, stream=stream)
+        if budget["within_budget"]:
+            break
+    preflight.update(plan=plan, degraded=degraded > 0, **cost, **budget)
+    if not budget["within_budget"]:
+        preflight["admitted"] = False
+        preflight["rejection"] = "over_budget"
+        preflight["reason"] = (f"Estimated analysis time of {budget['estimated_seconds']}s exceeds the "
+                               f"{budget['budget_seconds']:.0f}s budget even at the cheapest sampling.")
+    return preflight
+
+def run_analysis(video_path, filename, options):
+    cascade_param = options.get('cascade')
+    cascade = None if cascade_param is None else str(cascade_param).lower() in ('1', 'true', 'on')
+    stream = options.get('mode') == 'stream'
+
+    preflight = preflight_video(video_path, stream)
+    if not preflight["admitted"]:
+        logger.warning(f"Pre-flight rejected '{filename}' for {session.get('username')}: {preflight['reason']}")
+        discard_video(video_path)
+        status = 422 if preflight["rejection"] == "corrupt" else 413
+        return jsonify({"success": False, "message": preflight["reason"], "preflight": preflight}), status
+
+    if not admission_controller.acquire(session['user_id']):
+        discard_video(video_path)
+        return jsonify({"success": False, "message": "The system is busy. Please try again shortly.",
+                        "preflight": preflight}), 429
+    try:
+        if preflight["degraded"]:
+            logger.info(f"Analysing '{filename}' with coarser sampling {preflight['plan']} to stay within budget.")
+        if stream:
+            analysis_result = detection_engine.analyze_video_stream(
+                video_path, filename, cache_scope=session['user_id'], **preflight["plan"])
+        else:
+            analysis_result = detection_engine.analyze_video(
+                video_path, filename, cascade=cascade, cache_scope=session['user_id'], **preflight["plan"])
+    finally:
+        admission_controller.release(session['user_id'])
+
+    if analysis_result.get("success"):
+        if preflight["cost_units"] is not None:
+            admission_controller.observe(preflight["cost_units"], analysis_result.get("processing_time", 0.0))
+        analysis_result["preflight"] = preflight
+        result_id = result_storage.save_result(session['user_id'], analysis_result)
+        analysis_result['result_id'] = result_id
+        return jsonify(analysis_result)
+    else:
+        return jsonify(analysis_result), 500
+
+@app.route('/upload/init', methods=['POST'])
+@login_required
+def upload_init():
+    data = request.get_json() or {}
+    upload, msg = upload_manager.create_session(session['user_id'], data.get('filename'), data.get('total_size'))
+    if not upload:
+        logger.warning(f"Rejected chunked upload from {session.get('username')}: {msg}")
+        return jsonify({"success": False, "message": msg}), 400
+    return jsonify({"success": True, **upload.to_dict()})
+
+@app.route('/upload/<upload_id>', methods=['GET'])
+@login_required
+def upload_status(upload_id):
+    upload = upload_manager.get_session(upload_id, session['user_id'])
+    if not upload:
+        return jsonify({"success": False, "message": "Upload not found."}), 404
+    return jsonify({"success": True, **upload.to_dict()})
+
+@app.route('/upload/<upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    upload = upload_manager.get_session(upload_id, session['user_id'])
+    if not upload:
+        return jsonify({"success": False, "message": "Upload not found."}), 404
+    ok, msg = upload_manager.write_chunk(upload, request.args.get('offset'), request.stream)
+    if not ok:
+        return jsonify({"success": False, "message": msg, **upload.to_dict()}), 409
+    return jsonify({"success": True, **upload.to_dict()})
+
+@app.route('/upload/<upload_id>', methods=['DELETE'])
+@login_required
+def upload_abort(upload_id):
+    upload = upload_manager.get_session(upload_id, session['user_id'])
+    if not upload:
+        return jsonify({"success": False, "message": "Upload not found."}), 404
+    upload_manager.abort(upload)
+    return jsonify({"success": True, "message": "Upload aborted."})
+
+@app.route('/upload/<upload_id>/preflight', methods=['GET'])
+@login_required
+def upload_preflight(upload_id):
+    upload = upload_manager.get_session(upload_id, session['user_id'])
+    if not upload:
+        return jsonify({"success": False, "message": "Upload not found."}), 404
+    if not upload.complete:
+        return jsonify({"success": False, "message": "Pre-flight needs the complete file.", **upload.to_dict()}), 409
+    return jsonify({"success": True, "preflight": preflight_video(upload.path, request.args.get('mode') == 'stream')})
+
+@app.route('/upload/<upload_id>/finalize', methods=['POST'])
+@login_required
+def upload_finalize(upload_id):
+    upload = upload_manager.get_session(upload_id, session['user_id'])
+    if not upload:
+        return jsonify({"success": False, "message": "Upload not found."}), 404
+    data = request.get_json(silent=True) or {}
+    ok, msg = upload_manager.finalize(upload, data.get('sha256'))
+    if not ok:
+        return jsonify({"success": False, "message": msg, **upload.to_dict()}), 409
+
+    logger.info(f"Chunked upload '{upload.filename}' (saved as {os.path.basename(upload.path)}) for analysis by {session.get('username')}.")
+    try:
+        return run_analysis(upload.path, upload.filename, data)
+    except Exception:
+        logger.exception(f"Critical error during video analysis for user {session.get('username')}:")
+        if os.path.exists(upload.path):
+            try:
+                os.remove(upload.path)
+            except OSError as del_e:
+                logger.error(f"Error deleting upload {upload.path} during exception handling: {del_e}")
+        return jsonify({"success": False, "message": "An internal server error occurred."}), 500
+
 @app.route('/report')
 @login_required
 def report_page():
@@ -266,6 +432,29 @@ def update_password_page():
 def admin_dashboard_page():
     return render_template('admin_dashboard.html')
 
+@app.route('/admin/frame_cache_stats')
+@admin_required
+def admin_frame_cache_stats():
+    if detection_engine.frame_cache is None:
+        return jsonify({"enabled": False})
+    stats = detection_engine.frame_cache.stats()
+    stats['enabled'] = True
+    return jsonify(stats)
+
+@app.route('/admin/stats')
+@admin_required
+def admin_stats():
+    stats = result_storage.aggregates.snapshot()
+    for user_id, counts in stats['by_user'].items():
+        user = user_manager.get_user_by_id(user_id)
+        counts['username'] = user.username if user else "Unknown User"
+    return jsonify(stats)
+
+@app.route('/admin/admission')
+@admin_required
+def admin_admission_status():
+    return jsonify(admission_controller.status())
+
 @app.route('/admin/users')
 @admin_required
 def admin_users_page():
@@ -309,6 +498,41 @@ def admin_all_results_page():
         res['username'] = user.username if user else "Unknown User"
     return render_template('admin_all_results.html', results=all_results)
 
+@app.route('/admin/results/rescore', methods=['POST'])
+@admin_required
+def admin_rescore_results():
+    if detection_engine.frame_archive is None:
+        return jsonify({"success": False, "message": "Frame archive is disabled."}), 400
+    job, created = rescore_jobs.start(session.get('username'))
+    message = "Re-score job started." if created else "A re-score job is already running."
+    return jsonify({"success": True, "message": message, "job": job.to_dict()}), 202
+
+@app.route('/admin/results/rescore/<job_id>')
+@admin_required
+def admin_rescore_status(job_id):
+    job = rescore_jobs.get(job_id)
+    if not job:
+        return jsonify({"success": False, "message": "Re-score job not found."}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
+
+@app.route('/admin/results/export')
+@admin_required
+def admin_export_results():
+    export_format = request.args.get('format', 'jsonl').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"success": False, "message": f"Unsupported format. Please use {', '.join(EXPORT_FORMATS)}."}), 400
+    filters, msg = parse_export_filters(request.args, user_manager)
+    if filters is None:
+        return jsonify({"success": False, "message": msg}), 400
+
+    logger.info(f"Admin '{session.get('username')}' started a {export_format} results export with filters {filters}.")
+    export_filename = f"deepguard_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    return Response(
+        stream_with_context(iter_export(result_storage, user_manager, export_format, filters)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment;filename={export_filename}'}
+    )
+
 @app.route('/uploads/frames/<filename>')
 @login_required
 def uploaded_frame(filename):
@@ -328,4 +552,5 @@ def add_security_headers(response):
 
 if __name__ == '__main__':
     logger.info("Starting DeepGuard Detection System (Modularized)...")
+    prune_orphaned_archives()
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
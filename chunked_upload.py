@@ -0,0 +1,140 @@
+# chunked_upload.py
+import os
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional, Tuple, Any
+from werkzeug.utils import secure_filename
+from werkzeug.exceptions import ClientDisconnected
+
+from processing import allowed_file_processing, ALLOWED_EXTENSIONS_PROC
+
+logger = logging.getLogger(__name__)
+
+CHUNKED_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024
+CHUNK_SIZE_HINT = 8 * 1024 * 1024
+
+class UploadSession:
+    def __init__(self, user_id: str, filename: str, total_size: int, upload_folder: str):
+        self.upload_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.filename = filename
+        self.total_size = total_size
+        self.path = os.path.join(upload_folder, f"{self.upload_id}_{filename}")
+        self.received = 0
+        self.hasher = hashlib.sha256()
+        self.lock = threading.Lock()
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    @property
+    def complete(self) -> bool:
+        return self.received == self.total_size
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "total_size": self.total_size,
+            "offset": self.received,
+            "complete": self.complete,
+            "chunk_size": CHUNK_SIZE_HINT
+        }
+
+class ChunkedUploadManager:
+    def __init__(self, upload_folder: str, max_size: int = CHUNKED_UPLOAD_MAX_SIZE,
+                 session_ttl: float = 24 * 3600, block_size: int = 1024 * 1024):
+        self.upload_folder = upload_folder
+        self.max_size = max_size
+        self.session_ttl = session_ttl
+        self.block_size = block_size
+        self.sessions: Dict[str, UploadSession] = {}
+        self._lock = threading.Lock()
+
+    def create_session(self, user_id: str, filename: str, total_size: Any) -> Tuple[Optional[UploadSession], str]:
+        self.cleanup_expired()
+        if not filename:
+            return None, "No file selected."
+        if not allowed_file_processing(filename):
+            return None, f"Unsupported format. Please use {', '.join(ALLOWED_EXTENSIONS_PROC)}."
+        try:
+            total_size = int(total_size)
+        except (TypeError, ValueError):
+            return None, "A valid total_size is required."
+        if total_size <= 0 or total_size > self.max_size:
+            return None, f"File size must be between 1 byte and {self.max_size // (1024 * 1024)} MB."
+
+        safe_name = secure_filename(filename)
+        session = UploadSession(user_id, safe_name, total_size, self.upload_folder)
+        open(session.path, 'wb').close()
+        with self._lock:
+            self.sessions[session.upload_id] = session
+        logger.info(f"Upload session {session.upload_id} opened for '{safe_name}' ({total_size} bytes) by user '{user_id}'.")
+        return session, "Upload session created."
+
+    def get_session(self, upload_id: str, user_id: str) -> Optional[UploadSession]:
+        with self._lock:
+            session = self.sessions.get(upload_id)
+        if not session or session.user_id != user_id:
+            return None
+        return session
+
+    def write_chunk(self, session: UploadSession, offset: Any, stream) -> Tuple[bool, str]:
+        try:
+            offset = int(offset)
+        except (TypeError, ValueError):
+            return False, "A valid offset is required."
+        with session.lock:
+            # Chunks must arrive in order so the running hash stays valid; a resuming client asks for the offset first.
+            if offset != session.received:
+                return False, f"Expected offset {session.received}."
+            with open(session.path, 'r+b') as f:
+                f.seek(offset)
+                while True:
+                    try:
+                        block = stream.read(self.block_size)
+                    except (ClientDisconnected, OSError):
+                        logger.warning(f"Upload {session.upload_id} interrupted at offset {session.received}.")
+                        session.updated_at = time.time()
+                        return False, "Connection interrupted; resume from the reported offset."
+                    if not block:
+                        break
+                    if session.received + len(block) > session.total_size:
+                        f.truncate(session.received)
+                        return False, "Chunk exceeds declared file size."
+                    f.write(block)
+                    session.hasher.update(block)
+                    session.received += len(block)
+            session.updated_at = time.time()
+        return True, "Chunk stored."
+
+    def finalize(self, session: UploadSession, expected_sha256: Optional[str] = None) -> Tuple[bool, str]:
+        with session.lock:
+            if not session.complete:
+                return False, f"Upload incomplete: {session.received} of {session.total_size} bytes received."
+            digest = session.hasher.hexdigest()
+            if expected_sha256 and expected_sha256.lower() != digest:
+                logger.warning(f"Checksum mismatch for upload {session.upload_id}.")
+                return False, "Checksum mismatch."
+            with self._lock:
+                self.sessions.pop(session.upload_id, None)
+        logger.info(f"Upload {session.upload_id} finalized ({session.total_size} bytes, sha256 {digest}).")
+        return True, digest
+
+    def abort(self, session: UploadSession):
+        with self._lock:
+            self.sessions.pop(session.upload_id, None)
+        try:
+            os.remove(session.path)
+        except OSError:
+            pass
+        logger.info(f"Upload session {session.upload_id} aborted.")
+
+    def cleanup_expired(self):
+        cutoff = time.time() - self.session_ttl
+        with self._lock:
+            expired = [s for s in self.sessions.values() if s.updated_at < cutoff]
+        for session in expired:
+            self.abort(session)
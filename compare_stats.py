@@ -0,0 +1,12 @@
+# compare_stats.py
+import sys
+import json
+
+from processing import VideoProcessor, compare_stats_backends
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python compare_stats.py <video_path>")
+        sys.exit(1)
+    frames, _ = VideoProcessor(upload_folder_base='uploads').extract_frames(sys.argv[1])
+    print(json.dumps(compare_stats_backends(frames), indent=2))
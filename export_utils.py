@@ -0,0 +1,86 @@
+# export_utils.py
+import io
+import csv
+import json
+import logging
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Any, Iterator, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {"jsonl": "application/x-ndjson", "csv": "text/csv"}
+EXPORT_FIELDS = [
+    "result_id", "user_id", "username", "filename", "timestamp", "classification", "confidence",
+    "frames_analyzed", "processing_time", "cnn_score_real", "lstm_score_real", "transformer_score_real"
+]
+EXPORT_BATCH_SIZE = 500
+
+def parse_export_filters(args, user_manager) -> Tuple[Optional[Dict[str, Any]], str]:
+    filters: Dict[str, Any] = {}
+    user = args.get('user')
+    if user:
+        match = user_manager.get_user_by_username(user) or user_manager.get_user_by_id(user)
+        if not match:
+            return None, f"Unknown user '{user}'."
+        filters['user_id'] = match.user_id
+    try:
+        if args.get('start'):
+            filters['start'] = datetime.strptime(args['start'], '%Y-%m-%d').timestamp()
+        if args.get('end'):
+            filters['end'] = (datetime.strptime(args['end'], '%Y-%m-%d') + timedelta(days=1)).timestamp()
+    except ValueError:
+        return None, "Dates must use the YYYY-MM-DD format."
+    label = args.get('label')
+    if label:
+        if label.upper() not in ("REAL", "FAKE"):
+            return None, "Label must be REAL or FAKE."
+        filters['label'] = label.upper()
+    return filters, "Filters parsed."
+
+def flatten_result(res: Dict[str, Any], usernames: Dict[str, str]) -> Dict[str, Any]:
+    details = res.get("details", {})
+    return {
+        "result_id": res.get("result_id"),
+        "user_id": res.get("user_id"),
+        "username": usernames.get(res.get("user_id"), "Unknown User"),
+        "filename": res.get("filename"),
+        "timestamp": datetime.fromtimestamp(res["timestamp"]).isoformat(timespec='seconds') if res.get("timestamp") else None,
+        "classification": res.get("classification"),
+        "confidence": res.get("confidence"),
+        "frames_analyzed": res.get("frames_analyzed"),
+        "processing_time": res.get("processing_time"),
+        "cnn_score_real": details.get("cnn_score_real"),
+        "lstm_score_real": details.get("lstm_score_real"),
+        "transformer_score_real": details.get("transformer_score_real")
+    }
+
+def iter_export_batches(results: Iterable[Dict[str, Any]], user_manager,
+                        batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[list]:
+    results = iter(results)
+    while True:
+        batch = list(islice(results, batch_size))
+        if not batch:
+            return
+        usernames = user_manager.get_usernames({res["user_id"] for res in batch})
+        yield [flatten_result(res, usernames) for res in batch]
+
+def iter_jsonl(batches: Iterable[list]) -> Iterator[str]:
+    for rows in batches:
+        yield "".join(json.dumps(row) + "\n" for row in rows)
+
+def iter_csv(batches: Iterable[list]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate(0)
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+def iter_export(result_storage, user_manager, export_format: str, filters: Dict[str, Any],
+                batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    batches = iter_export_batches(result_storage.iter_results(**filters), user_manager, batch_size)
+    return iter_csv(batches) if export_format == "csv" else iter_jsonl(batches)
@@ -0,0 +1,92 @@
+# frame_archive.py
+import os
+import time
+import uuid
+import logging
+import threading
+import numpy as np
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class FrameArchive:
+    def __init__(self, archive_folder: str, retention_seconds: float = 7 * 24 * 3600, cleanup_interval: float = 3600.0):
+        self.archive_folder = archive_folder
+        self.retention_seconds = retention_seconds
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0.0
+        self._cleanup_lock = threading.Lock()
+        os.makedirs(self.archive_folder, exist_ok=True)
+
+    def _path(self, archive_id: str) -> str:
+        return os.path.join(self.archive_folder, f"{archive_id}.npy")
+
+    def save(self, processed_frames: List[np.ndarray]) -> Optional[str]:
+        if not processed_frames:
+            return None
+        self._maybe_cleanup()
+        archive_id = uuid.uuid4().hex
+        first = processed_frames[0]
+        shape = (len(processed_frames),) + first.shape
+        try:
+            stack = np.lib.format.open_memmap(self._path(archive_id), mode='w+', dtype=np.uint8, shape=shape)
+            for i, frame in enumerate(processed_frames):
+                if frame.dtype == np.uint8:
+                    stack[i] = frame
+                else:
+                    # Float frames are in [0, 1]; uint8 keeps the archive at a quarter of the float32 size.
+                    stack[i] = np.clip(np.rint(frame * 255.0), 0, 255).astype(np.uint8)
+            stack.flush()
+            del stack
+        except (OSError, ValueError) as e:
+            logger.error(f"Error archiving frames for {archive_id}: {e}")
+            self.delete(archive_id)
+            return None
+        logger.info(f"Archived {len(processed_frames)} frames as {archive_id}.")
+        return archive_id
+
+    def load(self, archive_id: str) -> Optional[np.ndarray]:
+        path = self._path(archive_id)
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode='r')
+
+    def delete(self, archive_id: str) -> bool:
+        try:
+            os.remove(self._path(archive_id))
+            return True
+        except OSError:
+            return False
+
+    def archive_ids(self) -> List[str]:
+        return [name[:-len(".npy")] for name in os.listdir(self.archive_folder) if name.endswith(".npy")]
+
+    def _maybe_cleanup(self):
+        # Expiry scans the whole folder, so it runs at most once per interval rather than on every save.
+        with self._cleanup_lock:
+            now = time.time()
+            if now - self._last_cleanup < self.cleanup_interval:
+                return
+            self._last_cleanup = now
+        self.cleanup_expired()
+
+    def cleanup_expired(self) -> int:
+        cutoff = time.time() - self.retention_seconds
+        expired = []
+        for archive_id in self.archive_ids():
+            try:
+                if os.path.getmtime(self._path(archive_id)) < cutoff:
+                    expired.append(archive_id)
+            except OSError:
+                continue
+        removed = sum(1 for archive_id in expired if self.delete(archive_id))
+        if removed:
+            logger.info(f"Removed {removed} frame archive(s) past the retention period.")
+        return removed
+
+    def prune(self, referenced: Iterable[str]) -> int:
+        referenced = set(referenced)
+        removed = sum(1 for archive_id in self.archive_ids() if archive_id not in referenced and self.delete(archive_id))
+        if removed:
+            logger.info(f"Removed {removed} frame archive(s) no longer referenced by a result.")
+        return removed
@@ -0,0 +1,218 @@
+# frame_ring.py
+import sys
+import uuid
+import queue
+import threading
+import cv2
+import numpy as np
+import logging
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Dict, Tuple, Any, Optional, Iterator
+
+logger = logging.getLogger(__name__)
+
+DECODE_DONE = -1
+DECODE_CANCEL = -2
+
+class SharedFrameRing:
+    def __init__(self, slot_count: int, frame_shape: Tuple[int, int, int], name: Optional[str] = None, create: bool = True):
+        self.slot_count = slot_count
+        self.frame_shape = tuple(frame_shape)
+        self.slot_nbytes = int(np.prod(self.frame_shape))
+        header_nbytes = slot_count * 3 * np.dtype(np.int32).itemsize
+        self._owner = create
+        size = header_nbytes + slot_count * self.slot_nbytes
+        if not create and sys.version_info >= (3, 13):
+            # Only the creating process should track the segment; attachers opt out where Python allows it.
+            self.shm = shared_memory.SharedMemory(name=name, create=False, size=size, track=False)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self._shapes = np.ndarray((slot_count, 3), dtype=np.int32, buffer=self.shm.buf)
+        self._slots = np.ndarray((slot_count, self.slot_nbytes), dtype=np.uint8, buffer=self.shm.buf, offset=header_nbytes)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def spec(self) -> Dict[str, Any]:
+        return {"name": self.name, "slot_count": self.slot_count, "frame_shape": self.frame_shape}
+
+    def write(self, slot: int, frame: np.ndarray) -> bool:
+        if frame.dtype != np.uint8 or frame.nbytes > self.slot_nbytes or len(frame.shape) != 3:
+            return False
+        self._slots[slot, :frame.nbytes] = frame.reshape(-1)
+        self._shapes[slot] = frame.shape
+        return True
+
+    def view(self, slot: int) -> np.ndarray:
+        shape = tuple(int(v) for v in self._shapes[slot])
+        return self._slots[slot, :int(np.prod(shape))].reshape(shape)
+
+    def close(self):
+        self._shapes = None
+        self._slots = None
+        try:
+            self.shm.close()
+        except BufferError:
+            logger.warning(f"Frame views into {self.name} are still referenced; mapping is released on garbage collection.")
+        if self._owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+def decode_into_ring(job: Dict[str, Any], free_slots, filled_slots):
+    job_id = job["job_id"]
+    ring_spec = job["ring"]
+    ring = SharedFrameRing(ring_spec["slot_count"], ring_spec["frame_shape"], name=ring_spec["name"], create=False)
+    cap = cv2.VideoCapture(job["video_path"])
+    try:
+        if not cap.isOpened():
+            logger.error(f"Could not open video file: {job['video_path']}")
+            return
+        frame_count = 0
+        extracted_count = 0
+        while extracted_count < job["max_frames"]:
+            if frame_count % job["sample_rate"] == 0:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                # Slot tokens left over from an earlier job are discarded; only this job's tokens are valid.
+                slot_job, slot = free_slots.get()
+                while slot_job != job_id:
+                    slot_job, slot = free_slots.get()
+                if slot == DECODE_CANCEL:
+                    break
+                if ring.write(slot, frame):
+                    filled_slots.put((job_id, slot, frame_count))
+                    extracted_count += 1
+                else:
+                    logger.warning(f"Frame {frame_count} of {job['video_path']} does not fit the ring slot, skipping.")
+                    free_slots.put((job_id, slot))
+            elif not cap.grab():
+                break
+            frame_count += 1
+    finally:
+        cap.release()
+        filled_slots.put((job_id, DECODE_DONE, DECODE_DONE))
+        ring.close()
+
+def decoder_worker_loop(jobs, free_slots, filled_slots):
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        try:
+            decode_into_ring(job, free_slots, filled_slots)
+        except Exception as e:
+            logger.error(f"Decoder worker failed on {job.get('video_path')}: {e}")
+
+class DecoderWorker:
+    def __init__(self, ctx):
+        self.jobs = ctx.Queue()
+        self.free_slots = ctx.Queue()
+        self.filled_slots = ctx.Queue()
+        self.process = ctx.Process(target=decoder_worker_loop, args=(self.jobs, self.free_slots, self.filled_slots), daemon=True)
+        self.process.start()
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        for q in (self.jobs, self.free_slots, self.filled_slots):
+            q.close()
+
+class SharedMemoryFrameDecoder:
+    def __init__(self, slot_count: int = 8, timeout: float = 30.0, workers: int = 2):
+        self.slot_count = slot_count
+        self.timeout = timeout
+        self.worker_count = max(1, workers)
+        self._ctx = mp.get_context("spawn")
+        self._idle: "queue.Queue[Optional[DecoderWorker]]" = queue.Queue()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def _checkout(self) -> DecoderWorker:
+        # Workers are spawned once and reused, so the interpreter start-up cost is not paid per video.
+        with self._start_lock:
+            if not self._started:
+                for _ in range(self.worker_count):
+                    self._idle.put(None)
+                self._started = True
+        worker = self._idle.get()
+        if worker is None or not worker.alive():
+            worker = DecoderWorker(self._ctx)
+        return worker
+
+    def _checkin(self, worker: Optional[DecoderWorker]):
+        self._idle.put(worker if worker is not None and worker.alive() else None)
+
+    def shutdown(self):
+        while not self._idle.empty():
+            worker = self._idle.get_nowait()
+            if worker is not None:
+                worker.jobs.put(None)
+                worker.stop()
+
+    def probe_frame_shape(self, video_path: str) -> Optional[Tuple[int, int, int]]:
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                return None
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            return (height, width, 3) if width > 0 and height > 0 else None
+        finally:
+            cap.release()
+
+    def _wait_for_done(self, worker: DecoderWorker, job_id: str) -> bool:
+        while True:
+            try:
+                msg_job, slot, _ = worker.filled_slots.get(timeout=self.timeout)
+            except queue.Empty:
+                return False
+            if msg_job == job_id and slot == DECODE_DONE:
+                return True
+
+    def iter_frames(self, video_path: str, sample_rate: int = 5, max_frames: int = 20) -> Iterator[Tuple[int, np.ndarray]]:
+        frame_shape = self.probe_frame_shape(video_path)
+        if frame_shape is None:
+            logger.error(f"Could not read frame geometry for: {video_path}")
+            return
+        worker = self._checkout()
+        ring = SharedFrameRing(self.slot_count, frame_shape)
+        job_id = uuid.uuid4().hex
+        finished = False
+        try:
+            for slot in range(self.slot_count):
+                worker.free_slots.put((job_id, slot))
+            worker.jobs.put({"job_id": job_id, "video_path": video_path, "ring": ring.spec(),
+                             "sample_rate": sample_rate, "max_frames": max_frames})
+            while True:
+                try:
+                    msg_job, slot, frame_index = worker.filled_slots.get(timeout=self.timeout)
+                except queue.Empty:
+                    logger.error(f"Decoder for {video_path} stalled, restarting worker.")
+                    worker.stop()
+                    worker = None
+                    break
+                if msg_job != job_id:
+                    continue
+                if slot == DECODE_DONE:
+                    finished = True
+                    break
+                # The view is only valid until the consumer advances; the slot is then handed back to the decoder.
+                yield frame_index, ring.view(slot)
+                worker.free_slots.put((job_id, slot))
+        finally:
+            if worker is not None and not finished:
+                worker.free_slots.put((job_id, DECODE_CANCEL))
+                if not self._wait_for_done(worker, job_id):
+                    worker.stop()
+                    worker = None
+            self._checkin(worker)
+            ring.close()
@@ -1,8 +1,11 @@
 # models.py
 import uuid
 import time
+import bisect
 import logging
-from typing import List, Dict, Optional, Any
+import threading
+from collections import deque
+from typing import List, Dict, Optional, Any, Iterable, Iterator
 from werkzeug.security import generate_password_hash, check_password_hash
 
 logger = logging.getLogger(__name__)
@@ -67,12 +70,99 @@ class UserManager:
         logger.warning(f"Attempt to delete non-existent user: {username}")
         return False
 
+    def get_usernames(self, user_ids: Iterable[str]) -> Dict[str, str]:
+        usernames = {}
+        for user_id in user_ids:
+            user = self.users_by_id.get(user_id)
+            usernames[user_id] = user.username if user else "Unknown User"
+        return usernames
+
     def get_all_users(self) -> List[Dict]:
         return [user.to_dict() for user in self.users_by_id.values()]
 
+class ResultAggregates:
+    def __init__(self, latency_window: int = 1000):
+        self.total = 0
+        self.frames_analyzed = 0
+        self.by_label: Dict[str, int] = {"REAL": 0, "FAKE": 0}
+        self.by_user: Dict[str, Dict[str, int]] = {}
+        self.by_day: Dict[str, Dict[str, int]] = {}
+        self._latency_window = latency_window
+        self._latencies: deque = deque()
+        self._sorted_latencies: List[float] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _day(timestamp: float) -> str:
+        return time.strftime('%Y-%m-%d', time.localtime(timestamp))
+
+    def _bucket(self, table: Dict[str, Dict[str, int]], key: str) -> Dict[str, int]:
+        if key not in table:
+            table[key] = {"total": 0, "REAL": 0, "FAKE": 0}
+        return table[key]
+
+    def record(self, result_data: Dict[str, Any]):
+        label = result_data.get('classification')
+        latency = float(result_data.get('processing_time', 0.0))
+        with self._lock:
+            self.total += 1
+            self.frames_analyzed += int(result_data.get('frames_analyzed', 0))
+            for bucket in (self._bucket(self.by_user, result_data['user_id']),
+                           self._bucket(self.by_day, self._day(result_data['timestamp']))):
+                bucket["total"] += 1
+                if label in bucket:
+                    bucket[label] += 1
+            if label in self.by_label:
+                self.by_label[label] += 1
+
+            # A bounded window keeps percentile upkeep independent of how many results exist.
+            self._latencies.append(latency)
+            bisect.insort(self._sorted_latencies, latency)
+            if len(self._latencies) > self._latency_window:
+                oldest = self._latencies.popleft()
+                del self._sorted_latencies[bisect.bisect_left(self._sorted_latencies, oldest)]
+
+    def relabel(self, result_data: Dict[str, Any], old_label: str, new_label: str):
+        if old_label == new_label:
+            return
+        with self._lock:
+            for table in (self.by_label,
+                          self._bucket(self.by_user, result_data['user_id']),
+                          self._bucket(self.by_day, self._day(result_data['timestamp']))):
+                if old_label in table:
+                    table[old_label] -= 1
+                if new_label in table:
+                    table[new_label] += 1
+
+    def _percentile(self, fraction: float) -> Optional[float]:
+        if not self._sorted_latencies:
+            return None
+        index = min(len(self._sorted_latencies) - 1, int(round(fraction * (len(self._sorted_latencies) - 1))))
+        return self._sorted_latencies[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total_results": self.total,
+                "frames_analyzed": self.frames_analyzed,
+                "by_label": dict(self.by_label),
+                "by_user": {user_id: dict(counts) for user_id, counts in self.by_user.items()},
+                "by_day": {day: dict(counts) for day, counts in sorted(self.by_day.items())},
+                "latency": {
+                    "window": len(self._latencies),
+                    "p50": self._percentile(0.5),
+                    "p90": self._percentile(0.9),
+                    "p99": self._percentile(0.99),
+                    "max": self._sorted_latencies[-1] if self._sorted_latencies else None
+                }
+            }
+
 class ResultStorage:
     def __init__(self):
         self.results: Dict[str, Dict[str, Any]] = {}
+        # Append-only id log so exports can walk results by position while new ones keep arriving.
+        self._order: List[str] = []
+        self.aggregates = ResultAggregates()
 
     def save_result(self, user_id: str, result_data: Dict[str, Any]) -> str:
         result_id = str(uuid.uuid4())
@@ -80,9 +170,26 @@ class ResultStorage:
         result_data['user_id'] = user_id
         result_data['timestamp'] = time.time()
         self.results[result_id] = result_data
+        self._order.append(result_id)
+        self.aggregates.record(result_data)
         logger.info(f"Result '{result_id}' saved for user '{user_id}'.")
         return result_id
 
+    def update_result(self, result_id: str, updates: Dict[str, Any]) -> bool:
+        result = self.results.get(result_id)
+        if not result:
+            logger.warning(f"Attempt to update non-existent result: {result_id}")
+            return False
+        old_label = result.get('classification')
+        updates = dict(updates)
+        if 'details' in updates:
+            # Details are merged so fields the update does not recompute (cache hits, ROI stats) survive it.
+            updates['details'] = {**result.get('details', {}), **updates['details']}
+        result.update(updates)
+        result['rescored_at'] = time.time()
+        self.aggregates.relabel(result, old_label, result.get('classification'))
+        return True
+
     def get_result(self, result_id: str) -> Optional[Dict[str, Any]]:
         return self.results.get(result_id)
 
@@ -92,4 +199,22 @@ class ResultStorage:
 
     def get_all_results(self) -> List[Dict[str, Any]]:
         all_results = list(self.results.values())
-        return sorted(all_results, key=lambda x: x['timestamp'], reverse=True)
\ No newline at end of file
+        return sorted(all_results, key=lambda x: x['timestamp'], reverse=True)
+
+    def iter_results(self, user_id: Optional[str] = None, start: Optional[float] = None, end: Optional[float] = None,
+                     label: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        position = 0
+        while position < len(self._order):
+            res = self.results.get(self._order[position])
+            position += 1
+            if not res:
+                continue
+            if user_id is not None and res['user_id'] != user_id:
+                continue
+            if start is not None and res['timestamp'] < start:
+                continue
+            if end is not None and res['timestamp'] >= end:
+                continue
+            if label is not None and res.get('classification') != label:
+                continue
+            yield res
@@ -4,17 +4,105 @@ import numpy as np
 import os
 import time
 import uuid
+import math
 import logging
-from typing import List, Dict, Tuple, Any
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Any, Optional, Iterator, Hashable
+
+from frame_ring import SharedMemoryFrameDecoder
+from frame_archive import FrameArchive
 
 logger = logging.getLogger(__name__)
 
 ALLOWED_EXTENSIONS_PROC = {'mp4', 'avi', 'mov'}
 MAX_CONTENT_LENGTH_PROC = 100 * 1024 * 1024
+DECISION_THRESHOLD = 0.5
+# Detectors run on fixed-size preprocessed frames, so their cost is per sampled frame, in units of one decoded megapixel.
+ANALYSIS_COST_PER_FRAME = 8.0
 
 def allowed_file_processing(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS_PROC
 
+def dhash(frame: np.ndarray, hash_size: int = 8) -> int:
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if len(frame.shape) == 3 else frame
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+class FrameHashCache:
+    def __init__(self, capacity: int = 10000, max_distance: int = 0, hash_bits: int = 64):
+        self.capacity = capacity
+        self.max_distance = max_distance
+        # Pigeonhole: two hashes within max_distance bits agree exactly on at least one of max_distance + 1 bands.
+        self.band_count = max_distance + 1
+        self.band_width = -(-hash_bits // self.band_count)
+        # Entries are keyed by (scope, hash) so one uploader's frames never answer for another's.
+        self._entries: "OrderedDict[Tuple[Optional[Hashable], int], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._bands: List[Dict[Tuple[Optional[Hashable], int], set]] = [{} for _ in range(self.band_count)]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _band_keys(self, scope: Optional[Hashable], frame_hash: int) -> List[Tuple[Optional[Hashable], int]]:
+        mask = (1 << self.band_width) - 1
+        return [(scope, (frame_hash >> (i * self.band_width)) & mask) for i in range(self.band_count)]
+
+    def _find_match(self, scope: Optional[Hashable], frame_hash: int) -> Optional[Tuple[Optional[Hashable], int]]:
+        if (scope, frame_hash) in self._entries:
+            return scope, frame_hash
+        if self.max_distance <= 0:
+            return None
+        best_key, best_distance = None, self.max_distance + 1
+        for band, key in zip(self._bands, self._band_keys(scope, frame_hash)):
+            for candidate in band.get(key, ()):
+                distance = bin(candidate ^ frame_hash).count("1")
+                if distance < best_distance:
+                    best_key, best_distance = (scope, candidate), distance
+        return best_key
+
+    def get(self, frame_hash: int, scope: Optional[Hashable] = None) -> Optional[Tuple[float, Dict[str, Any]]]:
+        with self._lock:
+            match = self._find_match(scope, frame_hash)
+            if match is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(match)
+            self.hits += 1
+            return self._entries[match]
+
+    def put(self, frame_hash: int, score: float, details: Dict[str, Any], scope: Optional[Hashable] = None):
+        with self._lock:
+            entry_key = (scope, frame_hash)
+            if entry_key in self._entries:
+                self._entries.move_to_end(entry_key)
+                self._entries[entry_key] = (score, details)
+                return
+            self._entries[entry_key] = (score, details)
+            for band, key in zip(self._bands, self._band_keys(scope, frame_hash)):
+                band.setdefault(key, set()).add(frame_hash)
+            while len(self._entries) > self.capacity:
+                (evicted_scope, evicted), _ = self._entries.popitem(last=False)
+                for band, key in zip(self._bands, self._band_keys(evicted_scope, evicted)):
+                    band[key].discard(evicted)
+                    if not band[key]:
+                        del band[key]
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "capacity": self.capacity,
+                "max_distance": self.max_distance,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
 class VideoProcessor:
     def __init__(self, upload_folder_base: str):
         self.supported_formats = ALLOWED_EXTENSIONS_PROC
@@ -28,7 +116,62 @@ class VideoProcessor:
             return False, f"Unsupported format. Please use {', '.join(self.supported_formats)}."
         return True, "Video validated successfully."
 
-    def extract_frames(self, video_path: str, sample_rate: int = 5, max_frames: int = 20) -> Tuple[List[np.ndarray], List[str]]:
+    def probe_video(self, video_path: str) -> Dict[str, Any]:
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                return {"readable": False}
+            fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps = float(cap.get(cv2.CAP_PROP_FPS))
+            return {
+                "readable": True,
+                "frame_count": frame_count,
+                "fps": round(fps, 3),
+                "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                "codec": "".join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip("\x00 ") if fourcc > 0 else "",
+                "duration": round(frame_count / fps, 2) if fps > 0 and frame_count > 0 else None
+            }
+        finally:
+            cap.release()
+
+    def get_fps(self, video_path: str) -> float:
+        cap = cv2.VideoCapture(video_path)
+        try:
+            return float(cap.get(cv2.CAP_PROP_FPS)) if cap.isOpened() else 0.0
+        finally:
+            cap.release()
+
+    def save_preview_frame(self, frame: np.ndarray, index: int) -> str:
+        base_frame_save_path = os.path.join(self.upload_folder_base, 'frames')
+        os.makedirs(base_frame_save_path, exist_ok=True)
+        frame_filename = f"frame_{uuid.uuid4().hex[:8]}_{index}.jpg"
+        full_frame_path = os.path.join(base_frame_save_path, frame_filename)
+        cv2.imwrite(full_frame_path, frame)
+        return full_frame_path
+
+    def iter_frames(self, video_path: str, sample_rate: int = 5) -> Iterator[Tuple[int, np.ndarray]]:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            logger.error(f"Could not open video file: {video_path}")
+            return
+        frame_count = 0
+        try:
+            while True:
+                if frame_count % sample_rate == 0:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    yield frame_count, frame
+                elif not cap.grab():
+                    break
+                frame_count += 1
+        finally:
+            cap.release()
+
+    def extract_frames(self, video_path: str, sample_rate: int = 5, max_frames: int = 20,
+                       frame_hashes: Optional[List[int]] = None) -> Tuple[List[np.ndarray], List[str]]:
         frames = []
         frame_paths_for_report = []
         base_frame_save_path = os.path.join(self.upload_folder_base, 'frames')
@@ -49,6 +192,8 @@ class VideoProcessor:
                     break
                 if frame_count % sample_rate == 0:
                     frames.append(frame)
+                    if frame_hashes is not None:
+                        frame_hashes.append(dhash(frame))
                     if extracted_count < 5:
                         frame_filename = f"frame_{uuid.uuid4().hex[:8]}_{extracted_count}.jpg"
                         full_frame_path = os.path.join(base_frame_save_path, frame_filename)
@@ -63,51 +208,226 @@ class VideoProcessor:
         logger.info(f"Extracted {len(frames)} frames from {video_path}.")
         return frames, frame_paths_for_report
 
+class FaceROILocator:
+    def __init__(self, detect_width: int = 320, redetect_interval: int = 5, margin: float = 0.2,
+                 cascade_file: str = 'haarcascade_frontalface_default.xml'):
+        self.detect_width = detect_width
+        self.redetect_interval = max(1, redetect_interval)
+        self.margin = margin
+        cascade_path = os.path.join(cv2.data.haarcascades, cascade_file)
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            logger.error(f"Could not load face cascade: {cascade_path}")
+
+    def detect(self, frame: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        if self.cascade.empty():
+            return None
+        height, width = frame.shape[:2]
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if len(frame.shape) == 3 else frame
+        scale = min(1.0, self.detect_width / float(width))
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        faces = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(24, 24))
+        if len(faces) == 0:
+            return None
+        x, y, w, h = [v / scale for v in max(faces, key=lambda f: f[2] * f[3])]
+        pad_x, pad_y = w * self.margin, h * self.margin
+        x0, y0 = max(0, int(x - pad_x)), max(0, int(y - pad_y))
+        x1, y1 = min(width, int(x + w + pad_x)), min(height, int(y + h + pad_y))
+        return x0, y0, x1, y1
+
+    def locate_batch(self, frames: List[np.ndarray]) -> Tuple[List[Optional[Tuple[int, int, int, int]]], int]:
+        # Faces barely move between sampled frames, so the last good box is reused through later frames and
+        # missed re-detects; switching between crop and full frame mid-clip would read as temporal change.
+        boxes = []
+        box = None
+        detections_run = 0
+        for i, frame in enumerate(frames):
+            if i % self.redetect_interval == 0 or box is None:
+                detections_run += 1
+                detected = self.detect(frame)
+                if detected is not None:
+                    box = detected
+            boxes.append(box)
+        first_box = next((b for b in boxes if b is not None), None)
+        return [b if b is not None else first_box for b in boxes], detections_run
+
+class NumpyFrameStats:
+    name = "numpy"
+    input_dtype = np.float32
+
+    def variance(self, frame: np.ndarray) -> float:
+        return float(np.var(frame))
+
+    def mean(self, frame: np.ndarray) -> float:
+        return float(np.mean(frame))
+
+    def mean_abs_diff(self, frame_a: np.ndarray, frame_b: np.ndarray) -> float:
+        return float(np.mean(np.abs(frame_a - frame_b)))
+
+class OpenCVFrameStats:
+    # Works on uint8 frames with OpenCV's vectorised kernels; results are rescaled to the [0, 1] float domain.
+    name = "opencv"
+    input_dtype = np.uint8
+    scale = 255.0
+
+    def variance(self, frame: np.ndarray) -> float:
+        means, stds = cv2.meanStdDev(frame)
+        means, stds = means.flatten(), stds.flatten()
+        overall_mean = float(np.mean(means))
+        second_moment = float(np.mean(stds ** 2 + means ** 2))
+        return max(second_moment - overall_mean ** 2, 0.0) / (self.scale ** 2)
+
+    def mean(self, frame: np.ndarray) -> float:
+        channels = frame.shape[2] if len(frame.shape) == 3 else 1
+        return float(np.mean(cv2.mean(frame)[:channels])) / self.scale
+
+    def mean_abs_diff(self, frame_a: np.ndarray, frame_b: np.ndarray) -> float:
+        return self.mean(cv2.absdiff(frame_a, frame_b))
+
+STATS_BACKENDS = {"numpy": NumpyFrameStats, "opencv": OpenCVFrameStats}
+STATS_PARITY_TOLERANCE = 1e-4
+
 class FrameProcessor:
-    def __init__(self, target_size: Tuple[int, int] = (224, 224)):
+    def __init__(self, target_size: Tuple[int, int] = (224, 224), output_dtype=np.float32):
         self.target_size = target_size
+        self.output_dtype = output_dtype
+
+    def crop_to_roi(self, frame: np.ndarray, box: Optional[Tuple[int, int, int, int]]) -> np.ndarray:
+        if box is None:
+            return frame
+        x0, y0, x1, y1 = box
+        if x1 <= x0 or y1 <= y0:
+            return frame
+        return frame[y0:y1, x0:x1]
 
     def preprocess_frame(self, frame: np.ndarray) -> np.ndarray:
         resized = cv2.resize(frame, self.target_size)
         rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+        if self.output_dtype == np.uint8:
+            return rgb
         return (rgb.astype(np.float32) / 255.0)
 
-    def process_batch(self, frames: List[np.ndarray]) -> List[np.ndarray]:
-        return [self.preprocess_frame(frame) for frame in frames]
+    def process_batch(self, frames: List[np.ndarray],
+                      boxes: Optional[List[Optional[Tuple[int, int, int, int]]]] = None) -> List[np.ndarray]:
+        if boxes is None:
+            return [self.preprocess_frame(frame) for frame in frames]
+        return [self.preprocess_frame(self.crop_to_roi(frame, box)) for frame, box in zip(frames, boxes)]
 
 class CNNDetector:
+    def __init__(self, stats: Optional[NumpyFrameStats] = None):
+        self.stats = stats or NumpyFrameStats()
+
+    @staticmethod
+    def score_from_variance(color_variance: float) -> float:
+        return min(max(0.3 + color_variance * 10, 0.0), 1.0)
+
+    @staticmethod
+    def status_for_score(confidence_real: float) -> str:
+        return "normal" if confidence_real > 0.6 else ("suspicious" if confidence_real < 0.4 else "neutral")
+
     def detect(self, frame: np.ndarray) -> Tuple[float, Dict[str, Any]]:
-        color_variance = np.var(frame) if len(frame.shape) == 3 else 0
-        confidence_real = min(max(0.3 + color_variance * 10, 0.0), 1.0)
-        status = "normal" if confidence_real > 0.6 else ("suspicious" if confidence_real < 0.4 else "neutral")
+        color_variance = self.stats.variance(frame) if len(frame.shape) == 3 else 0
+        confidence_real = self.score_from_variance(color_variance)
+        status = self.status_for_score(confidence_real)
         return confidence_real, {"method": "CNN", "status": status, "color_variance": float(color_variance)}
 
 class LSTMDetector:
+    def __init__(self, stats: Optional[NumpyFrameStats] = None):
+        self.stats = stats or NumpyFrameStats()
+
+    @staticmethod
+    def score_from_avg_diff(avg_diff: float) -> float:
+        return min(max(0.4 + avg_diff * 20, 0.0), 1.0)
+
     def detect(self, frame_sequence: List[np.ndarray]) -> Tuple[float, Dict[str, Any]]:
         if len(frame_sequence) < 2:
             return 0.5, {"method": "LSTM", "error": "Not enough frames"}
-        frame_diffs = [np.mean(np.abs(frame_sequence[i+1] - frame_sequence[i])) for i in range(len(frame_sequence)-1)]
+        frame_diffs = [self.stats.mean_abs_diff(frame_sequence[i+1], frame_sequence[i]) for i in range(len(frame_sequence)-1)]
         avg_diff = np.mean(frame_diffs) if frame_diffs else 0
-        confidence_real = min(max(0.4 + avg_diff * 20, 0.0), 1.0)
+        confidence_real = self.score_from_avg_diff(avg_diff)
         return confidence_real, {"method": "LSTM", "avg_difference": float(avg_diff)}
 
 class TransformerDetector:
+    def __init__(self, stats: Optional[NumpyFrameStats] = None):
+        self.stats = stats or NumpyFrameStats()
+
+    @staticmethod
+    def score_from_consistency(consistency: float) -> float:
+        return min(max(0.7 - consistency * 5, 0.0), 1.0)
+
     def detect(self, frames: List[np.ndarray]) -> Tuple[float, Dict[str, Any]]:
         if not frames: return 0.5, {"method": "Transformer", "error": "No frames"}
-        global_means = [np.mean(frame) for frame in frames]
+        global_means = [self.stats.mean(frame) for frame in frames]
         consistency = np.std(global_means)
-        confidence_real = min(max(0.7 - consistency * 5, 0.0), 1.0)
+        confidence_real = self.score_from_consistency(consistency)
         return confidence_real, {"method": "Transformer", "consistency_std": float(consistency)}
 
+class RunningStats:
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self._m2 / self.count)) if self.count else 0.0
+
+class SegmentAccumulator:
+    def __init__(self, start_frame: int):
+        self.start_frame = start_frame
+        self.end_frame = start_frame
+        self.cnn_scores = RunningStats()
+        self.frame_diffs = RunningStats()
+        self.frame_means = RunningStats()
+
+    def add_frame(self, frame_index: int, cnn_score: float, frame_mean: float, frame_diff: Optional[float]):
+        self.end_frame = frame_index
+        self.cnn_scores.update(cnn_score)
+        self.frame_means.update(frame_mean)
+        if frame_diff is not None:
+            self.frame_diffs.update(frame_diff)
+
+    @property
+    def frames_analyzed(self) -> int:
+        return self.frame_means.count
+
+    def scores(self) -> Dict[str, float]:
+        return {
+            "cnn": self.cnn_scores.mean if self.cnn_scores.count else 0.5,
+            "lstm": LSTMDetector.score_from_avg_diff(self.frame_diffs.mean) if self.frame_diffs.count else 0.5,
+            "transformer": TransformerDetector.score_from_consistency(self.frame_means.std) if self.frame_means.count else 0.5
+        }
+
 class DeepfakeDetectionEngine:
-    def __init__(self, upload_folder_base: str):
+    def __init__(self, upload_folder_base: str, cascade_enabled: bool = False,
+                 frame_cache: Optional[FrameHashCache] = None, roi_locator: Optional[FaceROILocator] = None,
+                 frame_decoder: Optional[SharedMemoryFrameDecoder] = None, stats_backend: str = "numpy",
+                 frame_archive: Optional[FrameArchive] = None):
+        if stats_backend not in STATS_BACKENDS:
+            raise ValueError(f"Unknown statistics backend '{stats_backend}'. Use one of {', '.join(STATS_BACKENDS)}.")
+        self.stats = STATS_BACKENDS[stats_backend]()
         self.video_processor = VideoProcessor(upload_folder_base)
-        self.frame_processor = FrameProcessor()
-        self.cnn_detector = CNNDetector()
-        self.lstm_detector = LSTMDetector()
-        self.transformer_detector = TransformerDetector()
+        self.frame_processor = FrameProcessor(output_dtype=self.stats.input_dtype)
+        self.cnn_detector = CNNDetector(self.stats)
+        self.lstm_detector = LSTMDetector(self.stats)
+        self.transformer_detector = TransformerDetector(self.stats)
         self.weights = {"cnn": 0.4, "lstm": 0.3, "transformer": 0.3}
         self.upload_folder_base = upload_folder_base
+        self.cascade_enabled = cascade_enabled
+        # Cheapest first: CNN only scores the preview frames, Transformer takes one mean per frame,
+        # LSTM materialises a difference image for every consecutive pair.
+        self.cascade_order = ["cnn", "transformer", "lstm"]
+        self.frame_cache = frame_cache
+        self.roi_locator = roi_locator
+        self.frame_decoder = frame_decoder
+        self.frame_archive = frame_archive
 
     def _convert_to_python_types(self, data):
         if isinstance(data, dict):
@@ -120,39 +440,222 @@ class DeepfakeDetectionEngine:
             return int(data)
         return data
 
-    def analyze_video(self, video_path: str, original_filename: str) -> Dict[str, Any]:
-        start_time_analysis = time.time()
-        raw_frames, frame_preview_paths = self.video_processor.extract_frames(video_path)
-        if not raw_frames:
-            return {"success": False, "message": "Failed to extract frames."}
+    def _score_bounds(self, scores: Dict[str, float]) -> Tuple[float, float]:
+        lower = sum(self.weights[stage] * score for stage, score in scores.items())
+        upper = lower + sum(weight for stage, weight in self.weights.items() if stage not in scores)
+        return lower, upper
+
+    def _verdict_decided(self, bounds: Tuple[float, float]) -> bool:
+        lower, upper = bounds
+        return lower > DECISION_THRESHOLD or upper <= DECISION_THRESHOLD
 
-        processed_frames = self.frame_processor.process_batch(raw_frames)
+    def _cnn_detect_cached(self, p_frame: np.ndarray, frame_hash: Optional[int], cache_scope: Optional[str] = None,
+                           box: Optional[Tuple[int, int, int, int]] = None) -> Tuple[float, Dict[str, Any], bool]:
+        # The hash is of the raw frame, so the crop box joins the key: the same frame cropped differently is a different CNN input.
+        scope = (cache_scope, box)
+        if self.frame_cache is not None and frame_hash is not None:
+            cached = self.frame_cache.get(frame_hash, scope)
+            if cached is not None:
+                return cached[0], cached[1], True
+        score_real, details = self.cnn_detector.detect(p_frame)
+        if self.frame_cache is not None and frame_hash is not None:
+            self.frame_cache.put(frame_hash, score_real, details, scope)
+        return score_real, details, False
 
+    def _run_cnn_stage(self, processed_frames: List[np.ndarray], frame_preview_paths: List[str],
+                       frame_hashes: Optional[List[int]] = None, cache_scope: Optional[str] = None,
+                       frame_boxes: Optional[List[Optional[Tuple[int, int, int, int]]]] = None
+                       ) -> Tuple[float, List[Dict[str, Any]], int]:
         cnn_scores_real = []
         frame_statuses = []
+        cache_hits = 0
+        # Every sampled frame is scored, as in stream mode; only the first few carry a preview.
         for i, p_frame in enumerate(processed_frames):
+            frame_hash = frame_hashes[i] if frame_hashes and i < len(frame_hashes) else None
+            box = frame_boxes[i] if frame_boxes and i < len(frame_boxes) else None
+            score_real, details, cache_hit = self._cnn_detect_cached(p_frame, frame_hash, cache_scope, box)
+            cache_hits += cache_hit
+            cnn_scores_real.append(score_real)
             if i < len(frame_preview_paths):
-                score_real, details = self.cnn_detector.detect(p_frame)
-                cnn_scores_real.append(score_real)
                 frame_statuses.append({
                     "path": frame_preview_paths[i],
                     "status": details.get("status", "neutral"),
                     "color_variance": float(details.get("color_variance", 0.0))
                 })
-
         avg_cnn_score_real = np.mean(cnn_scores_real) if cnn_scores_real else 0.5
-        lstm_score_real, lstm_details = self.lstm_detector.detect(processed_frames)
-        transformer_score_real, trans_details = self.transformer_detector.detect(processed_frames)
+        return avg_cnn_score_real, frame_statuses, cache_hits
 
-        combined_score_real = (
-            self.weights["cnn"] * avg_cnn_score_real +
-            self.weights["lstm"] * lstm_score_real +
-            self.weights["transformer"] * transformer_score_real
-        )
+    def _run_stages(self, processed_frames: List[np.ndarray], frame_preview_paths: List[str], cascade: bool,
+                    frame_hashes: Optional[List[int]] = None, cache_scope: Optional[str] = None,
+                    frame_boxes: Optional[List[Optional[Tuple[int, int, int, int]]]] = None) -> Dict[str, Any]:
+        scores: Dict[str, float] = {}
+        stage_details: Dict[str, Dict[str, Any]] = {}
+        frame_statuses: List[Dict[str, Any]] = []
+        cnn_cache_hits = 0
+        skipped_stages = []
+        order = self.cascade_order if cascade else ["cnn", "lstm", "transformer"]
+        for stage in order:
+            if cascade and self._verdict_decided(self._score_bounds(scores)):
+                skipped_stages.append(stage)
+                continue
+            if stage == "cnn":
+                scores["cnn"], frame_statuses, cnn_cache_hits = self._run_cnn_stage(
+                    processed_frames, frame_preview_paths, frame_hashes, cache_scope, frame_boxes)
+            elif stage == "lstm":
+                scores["lstm"], stage_details["lstm"] = self.lstm_detector.detect(processed_frames)
+            elif stage == "transformer":
+                scores["transformer"], stage_details["transformer"] = self.transformer_detector.detect(processed_frames)
 
-        is_real = combined_score_real > 0.5
-        final_label = "REAL" if is_real else "FAKE"
-        final_confidence = (combined_score_real if is_real else (1.0 - combined_score_real)) * 100
+        lower, upper = self._score_bounds(scores)
+        if skipped_stages:
+            # The skipped stages could have scored anywhere in [0, 1], so report the bound closest to the
+            # threshold: the label is certain, the confidence is the least the full ensemble could give.
+            combined_score_real = lower if lower > DECISION_THRESHOLD else upper
+        else:
+            combined_score_real = self._combine_scores(scores)
+
+        cascade_info = None
+        if cascade:
+            cascade_info = {
+                "enabled": True,
+                "order": list(order),
+                "skipped_stages": skipped_stages,
+                "confidence_bounded": bool(skipped_stages),
+                "score_bounds": [round(float(lower), 3), round(float(upper), 3)]
+            }
+            if skipped_stages:
+                logger.info(f"Cascade decided early: skipped stages {skipped_stages}.")
+
+        return {
+            "scores": scores,
+            "stage_details": stage_details,
+            "frame_statuses": frame_statuses,
+            "combined_score_real": combined_score_real,
+            "cnn_cache_hits": cnn_cache_hits,
+            "cascade": cascade_info
+        }
+
+    def _process_with_roi(self, raw_frames: List[np.ndarray]
+                          ) -> Tuple[List[np.ndarray], List[Optional[Tuple[int, int, int, int]]], Dict[str, Any]]:
+        start_locate = time.perf_counter()
+        boxes, detections_run = self.roi_locator.locate_batch(raw_frames)
+        locate_time = time.perf_counter() - start_locate
+
+        start_preprocess = time.perf_counter()
+        processed_frames = self.frame_processor.process_batch(raw_frames, boxes)
+        preprocess_time = time.perf_counter() - start_preprocess
+
+        # The full-frame baseline is the median of several timed preprocess calls, so one cold call cannot skew it.
+        baseline_samples = []
+        for frame in raw_frames[:5]:
+            start_baseline = time.perf_counter()
+            self.frame_processor.preprocess_frame(frame)
+            baseline_samples.append(time.perf_counter() - start_baseline)
+
+        frame_sizes = [(frame.shape[0], frame.shape[1]) for frame in raw_frames]
+        roi_info = self._roi_summary(frame_sizes, boxes, detections_run, locate_time, preprocess_time, baseline_samples)
+        return processed_frames, boxes, roi_info
+
+    def _roi_summary(self, frame_sizes: List[Tuple[int, int]], boxes: List[Optional[Tuple[int, int, int, int]]],
+                     detections_run: int, locate_time: float, preprocess_time: float,
+                     baseline_samples: List[float]) -> Dict[str, Any]:
+        baseline_time = float(np.median(baseline_samples)) * len(frame_sizes) if baseline_samples else 0.0
+        full_pixels = sum(h * w for h, w in frame_sizes)
+        roi_pixels = sum((b[2] - b[0]) * (b[3] - b[1]) if b else h * w for (h, w), b in zip(frame_sizes, boxes))
+        roi_info = {
+            "frames_with_face": sum(1 for b in boxes if b is not None),
+            "frames_full_fallback": sum(1 for b in boxes if b is None),
+            "detections_run": detections_run,
+            "pixel_fraction": round(roi_pixels / full_pixels, 3) if full_pixels else 1.0,
+            "locate_time": round(locate_time, 4),
+            "preprocess_time": round(preprocess_time, 4),
+            "estimated_full_frame_time": round(baseline_time, 4),
+            "net_saving": round(baseline_time - (locate_time + preprocess_time), 4)
+        }
+        logger.info(f"ROI stage: {roi_info['frames_with_face']}/{len(frame_sizes)} frames cropped to faces, "
+                    f"net saving {roi_info['net_saving']}s.")
+        return roi_info
+
+    def _decode_shared(self, video_path: str, frame_hashes: Optional[List[int]], sample_rate: int = 5,
+                       max_frames: int = 20) -> Tuple[List[np.ndarray], List[str],
+                                                      List[Optional[Tuple[int, int, int, int]]], Optional[Dict[str, Any]]]:
+        processed_frames = []
+        frame_preview_paths = []
+        frame_boxes = []
+        frame_sizes = []
+        baseline_samples = []
+        detections_run = 0
+        locate_time = preprocess_time = 0.0
+        box = None
+        for i, (_, view) in enumerate(self.frame_decoder.iter_frames(video_path, sample_rate, max_frames)):
+            if frame_hashes is not None:
+                frame_hashes.append(dhash(view))
+            if i < 5:
+                frame_preview_paths.append(self.video_processor.save_preview_frame(view, i))
+            if self.roi_locator is not None:
+                # Ring slots are reused, so ROI timings are taken per frame here rather than over the batch.
+                if i % self.roi_locator.redetect_interval == 0 or box is None:
+                    start_locate = time.perf_counter()
+                    box = self.roi_locator.detect(view) or box
+                    locate_time += time.perf_counter() - start_locate
+                    detections_run += 1
+                if i < 5:
+                    start_baseline = time.perf_counter()
+                    self.frame_processor.preprocess_frame(view)
+                    baseline_samples.append(time.perf_counter() - start_baseline)
+                frame_sizes.append((view.shape[0], view.shape[1]))
+            frame_boxes.append(box)
+            start_preprocess = time.perf_counter()
+            processed_frames.append(self.frame_processor.preprocess_frame(self.frame_processor.crop_to_roi(view, box)))
+            preprocess_time += time.perf_counter() - start_preprocess
+            del view
+        logger.info(f"Decoded {len(processed_frames)} frames from {video_path} through shared memory.")
+        roi_info = None
+        if self.roi_locator is not None and processed_frames:
+            roi_info = self._roi_summary(frame_sizes, frame_boxes, detections_run, locate_time, preprocess_time,
+                                         baseline_samples)
+        return processed_frames, frame_preview_paths, frame_boxes, roi_info
+
+    def estimate_cost(self, probe: Dict[str, Any], stream: bool = False, sample_rate: int = 5,
+                      max_frames: Optional[int] = 20) -> Dict[str, Any]:
+        frame_count = int(probe.get("frame_count", 0))
+        width, height = int(probe.get("width", 0)), int(probe.get("height", 0))
+        # Containers without an index report 0 or -1 frames; batch mode is still bounded by its frame cap.
+        if frame_count > 0:
+            decoded_frames = frame_count if stream else min(frame_count, sample_rate * max_frames)
+        elif not stream:
+            decoded_frames = sample_rate * max_frames
+        else:
+            return {"decoded_frames": None, "sampled_frames": None, "cost_units": None}
+        sampled_frames = math.ceil(decoded_frames / sample_rate)
+        megapixels = width * height / 1e6
+        # Decoding pays for every frame at full resolution; only the sampled frames reach the detectors.
+        cost_units = decoded_frames * megapixels + sampled_frames * (megapixels + ANALYSIS_COST_PER_FRAME)
+        return {"decoded_frames": decoded_frames, "sampled_frames": sampled_frames, "cost_units": round(cost_units, 3)}
+
+    def analyze_video(self, video_path: str, original_filename: str, cascade: Optional[bool] = None,
+                      sample_rate: int = 5, max_frames: int = 20, cache_scope: Optional[str] = None) -> Dict[str, Any]:
+        start_time_analysis = time.time()
+        frame_hashes: Optional[List[int]] = [] if self.frame_cache is not None else None
+        roi_info = None
+        frame_boxes = None
+        if self.frame_decoder is not None:
+            processed_frames, frame_preview_paths, frame_boxes, roi_info = self._decode_shared(video_path, frame_hashes, sample_rate, max_frames)
+            if not processed_frames:
+                return {"success": False, "message": "Failed to extract frames."}
+        else:
+            raw_frames, frame_preview_paths = self.video_processor.extract_frames(
+                video_path, sample_rate, max_frames, frame_hashes=frame_hashes)
+            if not raw_frames:
+                return {"success": False, "message": "Failed to extract frames."}
+            if self.roi_locator is not None:
+                processed_frames, frame_boxes, roi_info = self._process_with_roi(raw_frames)
+            else:
+                processed_frames = self.frame_processor.process_batch(raw_frames)
+        use_cascade = self.cascade_enabled if cascade is None else cascade
+        stage_output = self._run_stages(processed_frames, frame_preview_paths, use_cascade, frame_hashes, cache_scope,
+                                        frame_boxes)
+        final_label, final_confidence = self._verdict(stage_output["combined_score_real"])
         processing_time_val = time.time() - start_time_analysis
 
         try:
@@ -161,6 +664,12 @@ class DeepfakeDetectionEngine:
         except OSError as e:
             logger.error(f"Error deleting uploaded file {video_path}: {e}")
 
+        details = self._build_details(stage_output)
+        if self.frame_cache is not None:
+            details["cnn_cache_hits"] = stage_output["cnn_cache_hits"]
+        if roi_info:
+            details["roi"] = roi_info
+
         result = {
             "success": True,
             "classification": final_label,
@@ -168,14 +677,188 @@ class DeepfakeDetectionEngine:
             "frames_analyzed": int(len(processed_frames)),
             "processing_time": round(float(processing_time_val), 2),
             "filename": original_filename,
-            "frame_previews": frame_statuses,
+            "frame_previews": stage_output["frame_statuses"],
+            "details": details
+        }
+        if self.frame_archive is not None:
+            result["frame_archive"] = self.frame_archive.save(processed_frames)
+        
+        return self._convert_to_python_types(result)
+
+    def _verdict(self, combined_score_real: float) -> Tuple[str, float]:
+        is_real = combined_score_real > DECISION_THRESHOLD
+        final_confidence = (combined_score_real if is_real else (1.0 - combined_score_real)) * 100
+        return ("REAL" if is_real else "FAKE"), final_confidence
+
+    def _build_details(self, stage_output: Dict[str, Any]) -> Dict[str, Any]:
+        scores = stage_output["scores"]
+        details: Dict[str, Any] = {}
+        for stage in ("cnn", "lstm", "transformer"):
+            # None marks a stage the cascade skipped, so consumers do not mistake it for a score of 0.
+            details[f"{stage}_score_real"] = round(float(scores[stage]), 3) if stage in scores else None
+        if stage_output["cascade"]:
+            details["skipped_stages"] = stage_output["cascade"]["skipped_stages"]
+        for stage in ("lstm", "transformer"):
+            if stage in stage_output["stage_details"]:
+                details[f"{stage}_details"] = self._convert_to_python_types(stage_output["stage_details"][stage])
+        if stage_output["cascade"]:
+            details["cascade"] = stage_output["cascade"]
+        return details
+
+    def rescore_result(self, result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        archive_id = result.get("frame_archive")
+        if self.frame_archive is None or not archive_id:
+            return None
+        archived = self.frame_archive.load(archive_id)
+        if archived is None:
+            logger.warning(f"Frame archive {archive_id} for result {result.get('result_id')} is missing.")
+            return None
+
+        if self.frame_processor.output_dtype == np.uint8:
+            frames = [archived[i] for i in range(len(archived))]
+        else:
+            frames = [archived[i].astype(np.float32) / 255.0 for i in range(len(archived))]
+        preview_paths = [fp.get("path") for fp in result.get("frame_previews", [])]
+        # Re-score with the cascade setting of the original analysis so confidence stays bounded or full as it was.
+        cascade = bool(result.get("details", {}).get("cascade"))
+        stage_output = self._run_stages(frames, preview_paths, cascade)
+        final_label, final_confidence = self._verdict(stage_output["combined_score_real"])
+
+        details = self._build_details(stage_output)
+        # Stage-dependent keys are always sent so a merge clears what the previous run produced.
+        for key in ("skipped_stages", "cascade", "lstm_details", "transformer_details"):
+            details.setdefault(key, None)
+        return self._convert_to_python_types({
+            "classification": final_label,
+            "confidence": round(float(final_confidence), 2),
+            "frame_previews": stage_output["frame_statuses"],
+            "details": details
+        })
+
+    def _combine_scores(self, scores: Dict[str, float]) -> float:
+        return sum(self.weights[stage] * scores[stage] for stage in ("cnn", "lstm", "transformer"))
+
+    def _segment_summary(self, index: int, segment: SegmentAccumulator, fps: float) -> Dict[str, Any]:
+        scores = segment.scores()
+        combined_score_real = self._combine_scores(scores)
+        return {
+            "segment": index,
+            "start_frame": segment.start_frame,
+            "end_frame": segment.end_frame,
+            "start_time": round(segment.start_frame / fps, 2) if fps > 0 else None,
+            "end_time": round(segment.end_frame / fps, 2) if fps > 0 else None,
+            "frames_analyzed": segment.frames_analyzed,
+            "classification": "REAL" if combined_score_real > DECISION_THRESHOLD else "FAKE",
+            "score_real": round(float(combined_score_real), 3),
+            "cnn_score_real": round(float(scores["cnn"]), 3),
+            "lstm_score_real": round(float(scores["lstm"]), 3),
+            "transformer_score_real": round(float(scores["transformer"]), 3)
+        }
+
+    def iter_segments(self, video_path: str, sample_rate: int = 5, window_size: int = 20,
+                      overall: Optional[SegmentAccumulator] = None,
+                      frame_previews: Optional[List[Dict[str, Any]]] = None,
+                      cache_scope: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        fps = self.video_processor.get_fps(video_path)
+        previous_frame = None
+        window = None
+        segment_index = 0
+        box = None
+        for i, (frame_index, frame) in enumerate(self.video_processor.iter_frames(video_path, sample_rate)):
+            if self.roi_locator is not None and (i % self.roi_locator.redetect_interval == 0 or box is None):
+                box = self.roi_locator.detect(frame) or box
+            p_frame = self.frame_processor.preprocess_frame(self.frame_processor.crop_to_roi(frame, box))
+            frame_hash = dhash(frame) if self.frame_cache is not None else None
+            cnn_score, cnn_details, _ = self._cnn_detect_cached(p_frame, frame_hash, cache_scope, box)
+            frame_mean = self.stats.mean(p_frame)
+            frame_diff = self.stats.mean_abs_diff(p_frame, previous_frame) if previous_frame is not None else None
+            previous_frame = p_frame
+
+            if window is None:
+                window = SegmentAccumulator(frame_index)
+            window.add_frame(frame_index, cnn_score, frame_mean, frame_diff)
+            if overall is not None:
+                overall.add_frame(frame_index, cnn_score, frame_mean, frame_diff)
+            if frame_previews is not None and len(frame_previews) < 5:
+                frame_previews.append({
+                    "path": self.video_processor.save_preview_frame(frame, len(frame_previews)),
+                    "status": cnn_details.get("status", "neutral"),
+                    "color_variance": float(cnn_details.get("color_variance", 0.0))
+                })
+
+            if window.frames_analyzed >= window_size:
+                yield self._segment_summary(segment_index, window, fps)
+                segment_index += 1
+                window = None
+        if window is not None:
+            yield self._segment_summary(segment_index, window, fps)
+
+    def analyze_video_stream(self, video_path: str, original_filename: str, sample_rate: int = 5,
+                             window_size: int = 20, cache_scope: Optional[str] = None) -> Dict[str, Any]:
+        start_time_analysis = time.time()
+        overall = SegmentAccumulator(0)
+        frame_previews: List[Dict[str, Any]] = []
+        timeline = list(self.iter_segments(video_path, sample_rate, window_size, overall, frame_previews, cache_scope))
+
+        try:
+            os.remove(video_path)
+            logger.info(f"Cleaned up uploaded file: {video_path}")
+        except OSError as e:
+            logger.error(f"Error deleting uploaded file {video_path}: {e}")
+
+        if not timeline:
+            return {"success": False, "message": "Failed to extract frames."}
+
+        scores = overall.scores()
+        combined_score_real = self._combine_scores(scores)
+        is_real = combined_score_real > DECISION_THRESHOLD
+        final_confidence = (combined_score_real if is_real else (1.0 - combined_score_real)) * 100
+        processing_time_val = time.time() - start_time_analysis
+        logger.info(f"Streamed {overall.frames_analyzed} frames of {original_filename} into {len(timeline)} segment(s).")
+
+        result = {
+            "success": True,
+            "classification": "REAL" if is_real else "FAKE",
+            "confidence": round(float(final_confidence), 2),
+            "frames_analyzed": overall.frames_analyzed,
+            "processing_time": round(float(processing_time_val), 2),
+            "filename": original_filename,
+            "frame_previews": frame_previews,
+            "timeline": timeline,
             "details": {
-                "cnn_score_real": round(float(avg_cnn_score_real), 3),
-                "lstm_score_real": round(float(lstm_score_real), 3),
-                "transformer_score_real": round(float(transformer_score_real), 3),
-                "lstm_details": self._convert_to_python_types(lstm_details),
-                "transformer_details": self._convert_to_python_types(trans_details)
+                "cnn_score_real": round(float(scores["cnn"]), 3),
+                "lstm_score_real": round(float(scores["lstm"]), 3),
+                "transformer_score_real": round(float(scores["transformer"]), 3),
+                "lstm_details": {"method": "LSTM", "avg_difference": float(overall.frame_diffs.mean)},
+                "transformer_details": {"method": "Transformer", "consistency_std": overall.frame_means.std},
+                "streaming": {"sample_rate": sample_rate, "window_size": window_size, "segments": len(timeline)}
             }
         }
-        
-        return self._convert_to_python_types(result)
\ No newline at end of file
+        return self._convert_to_python_types(result)
+
+
+def compare_stats_backends(raw_frames: List[np.ndarray], repeats: int = 3) -> Dict[str, Any]:
+    float_processor = FrameProcessor(output_dtype=np.float32)
+    uint8_processor = FrameProcessor(output_dtype=np.uint8)
+    report: Dict[str, Any] = {"frames": len(raw_frames), "tolerance": STATS_PARITY_TOLERANCE, "backends": {}}
+    scores: Dict[str, Dict[str, float]] = {}
+    for name, processor in (("numpy", float_processor), ("opencv", uint8_processor)):
+        stats = STATS_BACKENDS[name]()
+        detectors = (CNNDetector(stats), LSTMDetector(stats), TransformerDetector(stats))
+        frames = processor.process_batch(raw_frames)
+        best_time = None
+        for _ in range(max(1, repeats)):
+            start = time.perf_counter()
+            cnn_score = float(np.mean([detectors[0].detect(frame)[0] for frame in frames])) if frames else 0.5
+            lstm_score = float(detectors[1].detect(frames)[0])
+            transformer_score = float(detectors[2].detect(frames)[0])
+            elapsed = time.perf_counter() - start
+            best_time = elapsed if best_time is None else min(best_time, elapsed)
+        scores[name] = {"cnn": cnn_score, "lstm": lstm_score, "transformer": transformer_score}
+        report["backends"][name] = {"detector_time": round(best_time, 6), "bytes_per_frame": int(frames[0].nbytes) if frames else 0, "scores": scores[name]}
+    max_diff = max(abs(scores["numpy"][k] - scores["opencv"][k]) for k in scores["numpy"])
+    report["max_score_diff"] = max_diff
+    report["within_tolerance"] = max_diff <= STATS_PARITY_TOLERANCE
+    opencv_time = report["backends"]["opencv"]["detector_time"]
+    report["speedup"] = round(report["backends"]["numpy"]["detector_time"] / opencv_time, 2) if opencv_time else None
+    return report
@@ -73,6 +73,9 @@ def generate_overall_confidence_pie_chart(classification: str, confidence_percen
         logger.error(f"Exception in generate_overall_confidence_pie_chart: {e}", exc_info=True)
         raise
 
+def format_detector_score(value) -> str:
+    return "skipped" if value is None else f"{float(value):.3f}"
+
 def generate_detector_scores_bar_chart(details: Dict[str, float]) -> io.BytesIO:
     logger.debug(f"Generating bar chart with details: {details}")
     try:
@@ -83,11 +86,9 @@ def generate_detector_scores_bar_chart(details: Dict[str, float]) -> io.BytesIO:
         chart_secondary_text_color = PDF_SECONDARY_TEXT_COLOR_HEX
 
         components = ['CNN', 'LSTM', 'Transformer']
-        scores = [
-            float(details.get('cnn_score_real', 0.0)) * 100.0,
-            float(details.get('lstm_score_real', 0.0)) * 100.0,
-            float(details.get('transformer_score_real', 0.0)) * 100.0
-        ]
+        raw_scores = [details.get('cnn_score_real', 0.0), details.get('lstm_score_real', 0.0), details.get('transformer_score_real', 0.0)]
+        skipped = [value is None for value in raw_scores]
+        scores = [0.0 if value is None else float(value) * 100.0 for value in raw_scores]
         bar_colors_hex = ["#4A90E2", "#50E3C2", "#B57EDC"]
 
         bars = ax.barh(components, scores, color=bar_colors_hex, edgecolor='white', height=0.6)
@@ -105,7 +106,10 @@ def generate_detector_scores_bar_chart(details: Dict[str, float]) -> io.BytesIO:
                 if sum(matplotlib.colors.to_rgb(bar_colors_hex[bar_idx % len(bar_colors_hex)])) < 1.5 :
                     text_color_for_bar_label = 'white'
 
-            ax.text(text_x_pos, bar.get_y() + bar.get_height()/2., f'{width:.0f}%',
+            bar_label = 'skipped' if skipped[bar_idx] else f'{width:.0f}%'
+            if skipped[bar_idx]:
+                text_x_pos, ha_align, text_color_for_bar_label = 1, 'left', chart_secondary_text_color
+            ax.text(text_x_pos, bar.get_y() + bar.get_height()/2., bar_label,
                     ha=ha_align, va='center', color=text_color_for_bar_label, fontsize=7)
 
         ax.tick_params(axis='x', colors=chart_secondary_text_color, labelsize=7)
@@ -223,9 +227,9 @@ def generate_pdf_report(analysis_data: Dict[str, Any]) -> bytes:
     story.append(Paragraph("Detector Scores (Tabular Data)", heading_style))
     scores_data_table = [
         [Paragraph("Component", label_style), Paragraph("Score (Likelihood of REAL)", label_style)],
-        [Paragraph("CNN (Spatial)", body_text_style), Paragraph(f"{detector_scores_data.get('cnn_score_real', 0):.3f}", value_style)],
-        [Paragraph("LSTM (Temporal)", body_text_style), Paragraph(f"{detector_scores_data.get('lstm_score_real', 0):.3f}", value_style)],
-        [Paragraph("Transformer (Global)", body_text_style), Paragraph(f"{detector_scores_data.get('transformer_score_real', 0):.3f}", value_style)],
+        [Paragraph("CNN (Spatial)", body_text_style), Paragraph(format_detector_score(detector_scores_data.get('cnn_score_real', 0)), value_style)],
+        [Paragraph("LSTM (Temporal)", body_text_style), Paragraph(format_detector_score(detector_scores_data.get('lstm_score_real', 0)), value_style)],
+        [Paragraph("Transformer (Global)", body_text_style), Paragraph(format_detector_score(detector_scores_data.get('transformer_score_real', 0)), value_style)],
     ]
     scores_table = Table(scores_data_table, colWidths=[3*inch, 3.5*inch])
     scores_table.setStyle(TableStyle([
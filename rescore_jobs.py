@@ -0,0 +1,95 @@
+# rescore_jobs.py
+import time
+import uuid
+import logging
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RESCORE_BATCH_SIZE = 50
+
+class RescoreJob:
+    def __init__(self, result_ids, started_by: str):
+        self.job_id = uuid.uuid4().hex
+        self.result_ids = list(result_ids)
+        self.started_by = started_by
+        self.status = "running"
+        self.processed = 0
+        self.rescored = 0
+        self.skipped = 0
+        self.label_changes = 0
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total": len(self.result_ids),
+            "processed": self.processed,
+            "rescored": self.rescored,
+            "skipped": self.skipped,
+            "label_changes": self.label_changes,
+            "error": self.error,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class RescoreJobManager:
+    def __init__(self, detection_engine, result_storage, batch_size: int = RESCORE_BATCH_SIZE):
+        self.detection_engine = detection_engine
+        self.result_storage = result_storage
+        self.batch_size = max(1, batch_size)
+        self.jobs: Dict[str, RescoreJob] = {}
+        self._active: Optional[RescoreJob] = None
+        self._lock = threading.Lock()
+
+    def start(self, started_by: str) -> Tuple[RescoreJob, bool]:
+        with self._lock:
+            # One sweep at a time: a second request while one is running gets the running job back.
+            if self._active is not None and self._active.status == "running":
+                return self._active, False
+            result_ids = [res['result_id'] for res in self.result_storage.get_all_results()]
+            job = RescoreJob(result_ids, started_by)
+            self.jobs[job.job_id] = job
+            self._active = job
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        logger.info(f"Re-score job {job.job_id} started by '{started_by}' over {len(result_ids)} results.")
+        return job, True
+
+    def get(self, job_id: str) -> Optional[RescoreJob]:
+        return self.jobs.get(job_id)
+
+    def _rescore_one(self, job: RescoreJob, result_id: str):
+        res = self.result_storage.get_result(result_id)
+        try:
+            updates = self.detection_engine.rescore_result(res) if res else None
+        except Exception:
+            logger.exception(f"Error re-scoring result {result_id}:")
+            updates = None
+        if not updates:
+            job.skipped += 1
+            return
+        if updates['classification'] != res.get('classification'):
+            job.label_changes += 1
+        self.result_storage.update_result(result_id, updates)
+        job.rescored += 1
+
+    def _run(self, job: RescoreJob):
+        try:
+            for start in range(0, len(job.result_ids), self.batch_size):
+                for result_id in job.result_ids[start:start + self.batch_size]:
+                    self._rescore_one(job, result_id)
+                    job.processed += 1
+                logger.info(f"Re-score job {job.job_id}: {job.processed}/{len(job.result_ids)} processed.")
+            job.status = "completed"
+        except Exception as e:
+            logger.exception(f"Re-score job {job.job_id} failed:")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+        logger.info(f"Re-score job {job.job_id} {job.status}: {job.rescored} re-scored, "
+                    f"{job.label_changes} label changes, {job.skipped} skipped.")
@@ -0,0 +1,32 @@
+# tests/test_stats_parity.py
+import numpy as np
+import pytest
+
+from processing import STATS_PARITY_TOLERANCE, compare_stats_backends
+
+
+@pytest.fixture
+def synthetic_frames():
+    rng = np.random.RandomState(1234)
+    return [rng.randint(0, 256, size=(240, 320, 3), dtype=np.uint8) for _ in range(12)]
+
+
+def test_backends_agree_within_tolerance(synthetic_frames):
+    report = compare_stats_backends(synthetic_frames, repeats=1)
+    assert report["frames"] == len(synthetic_frames)
+    assert report["within_tolerance"], report
+
+
+@pytest.mark.parametrize("detector", ["cnn", "lstm", "transformer"])
+def test_each_detector_score_matches(synthetic_frames, detector):
+    report = compare_stats_backends(synthetic_frames, repeats=1)
+    numpy_score = report["backends"]["numpy"]["scores"][detector]
+    opencv_score = report["backends"]["opencv"]["scores"][detector]
+    assert abs(numpy_score - opencv_score) <= STATS_PARITY_TOLERANCE
+
+
+def test_static_frames_agree():
+    # Identical frames give zero temporal difference, which exercises the boundary of the LSTM and Transformer scores.
+    frame = np.full((120, 160, 3), 128, dtype=np.uint8)
+    report = compare_stats_backends([frame.copy() for _ in range(4)], repeats=1)
+    assert report["within_tolerance"], report